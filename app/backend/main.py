@@ -1,97 +1,434 @@
+import asyncio
+import grpc
+import hashlib
+import json
+import logging
+import orjson
 import os
+import re
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import weaviate
-from weaviate.classes.init import Auth
+from weaviate.classes.init import AdditionalConfig, Auth, GrpcConfig, Timeout
+from weaviate.classes.query import Filter
 from weaviate.agents.query import QueryAgent
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from dotenv import load_dotenv
+from cachetools import TTLCache
+from opentelemetry import trace
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
-from weaviate.agents.classes import ChatMessage
+from urllib.parse import urlparse
+from weaviate.agents.classes import ChatMessage, StreamedTokens
 
 load_dotenv()
 
-app = FastAPI()
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
 
-# CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for debugging
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Size of the pool that blocking Weaviate calls are offloaded to. Each in-flight
+# chat request holds one thread while it waits on the agent, so this bounds concurrency.
+WEAVIATE_THREADS = int(os.environ.get("WEAVIATE_THREADS", "64"))
+
+# Collections the agent answers from, and the only ones sources can be fetched from
+COLLECTIONS = ["ArxivPDFs", "PDFchunks1"]
 
+# Properties returned for sources. Everything the frontend shows, but not the full PDF text.
+SOURCE_PROPERTIES = {
+    "ArxivPDFs": ["title", "abstract", "pdf_url", "date", "authors"],
+    "PDFchunks1": ["chunk_id", "doc_id", "chunk_text", "start_index", "end_index", "doc_title"],
+}
 
 # Best practice: store your credentials in environment variables
 weaviate_url = os.environ["WEAVIATE_URL"]
 weaviate_api_key = os.environ["WEAVIATE_API_KEY"]
 
-client = weaviate.connect_to_weaviate_cloud(
-    cluster_url=weaviate_url,
-    auth_credentials=Auth.api_key(weaviate_api_key),
-)
 
-qa = QueryAgent(
-    client=client, collections=["ArxivPDFs", "PDFchunks1"]
+def check_weaviate_dns(url: str):
+    """
+    Checks at startup that the cluster's REST and gRPC hostnames resolve and logs their addresses, so a DNS problem
+    shows up in the startup log rather than as a failed first request. Nothing is cached or pinned.
+    """
+    host = urlparse(url if "://" in url else f"https://{url}").hostname
+    for hostname in (host, f"grpc-{host}"):
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(hostname, 443, type=socket.SOCK_STREAM)}
+            logger.info("Resolved %s to %s", hostname, ", ".join(sorted(addresses)))
+        except OSError as e:
+            logger.warning("Could not resolve %s: %s", hostname, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = ThreadPoolExecutor(max_workers=WEAVIATE_THREADS, thread_name_prefix="weaviate")
+    asyncio.get_running_loop().set_default_executor(executor)
+
+    await asyncio.to_thread(check_weaviate_dns, weaviate_url)
+
+    # One client and agent per process, shared by every request
+    client = weaviate.connect_to_weaviate_cloud(
+        cluster_url=weaviate_url,
+        auth_credentials=Auth.api_key(weaviate_api_key),
+        additional_config=AdditionalConfig(
+            timeout=Timeout(init=10, query=60, insert=120),
+            # Queries and object fetches go over gRPC; compress them since chunk and PDF texts are large
+            grpc_config=GrpcConfig(
+                channel_options=[("grpc.default_compression_algorithm", grpc.Compression.Gzip.value)]
+            ),
+        ),
+    )
+    app.state.client = client
+    app.state.qa = QueryAgent(
+        client=client, collections=COLLECTIONS
+    )
+    app.state.collections = {name: client.collections.use(name) for name in COLLECTIONS}
+    app.state.source_loader = SourceLoader()
+
+    yield
+
+    client.close()
+    executor.shutdown(wait=False)
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, which also handles the UUIDs and dates in Weaviate properties natively.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Request spans for every endpoint. Spans are exported when run under an OpenTelemetry SDK,
+# e.g. `opentelemetry-instrument python main.py`, and are no-ops otherwise.
+FastAPIInstrumentor.instrument_app(app)
+
+# CORS configuration: only the frontend's exact origins, comma separated in CORS_ORIGINS
+cors_origins = os.environ.get("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[origin.strip() for origin in cors_origins.split(",") if origin.strip()],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
 )
 
+# Answers to recently asked conversations, so repeated questions skip the agent entirely.
+# Entries expire so newly ingested PDFs show up in answers without a restart.
+answer_cache = TTLCache(maxsize=1024, ttl=600)
+answer_cache_lock = threading.RLock()
+
+
+# Only the most recent turns of a conversation are sent to the agent
+MAX_TURNS = 32
 
 class Message(BaseModel):
     role: str
-    content: str
+    content: str = Field(..., max_length=16000)
 
 class ChatRequest(BaseModel):
-    messages: List[Message]
+    messages: List[Message] = Field(..., min_length=1, max_length=64)
 
 class Source(BaseModel):
-    object_id: str
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+    # Parsed as a UUID so malformed ids are rejected with a 422 before they reach a query
+    object_id: uuid.UUID
     collection: str
 
+def conversation_key(messages: List[Message]) -> str:
+    """
+    Hashes a conversation into a cache key. Case and whitespace are normalized so trivially different phrasings share an entry.
+    """
+    normalized = [(msg.role, " ".join(msg.content.lower().split())) for msg in messages]
+    return hashlib.blake2b(json.dumps(normalized).encode(), digest_size=16).hexdigest()
+
+# Messages that get a fixed reply instead of a round-trip to the agent
+DIRECT_REPLIES = [
+    (re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening))\b[\s!.]*$", re.IGNORECASE),
+     "Hi! Ask me anything about your documents."),
+    (re.compile(r"^(thanks|thank you|thx|cheers)\b[\s!.]*$", re.IGNORECASE),
+     "You're welcome! Let me know if you have any other questions."),
+]
+
+def direct_reply(messages: List[Message]) -> Optional[str]:
+    """
+    Returns a canned reply when the last message is too short or a simple greeting, so it isn't sent to the agent.
+    """
+    if messages[-1].role != "user":
+        raise HTTPException(status_code=422, detail="The last message must be from the user")
+
+    query = messages[-1].content.strip()
+    for pattern, reply in DIRECT_REPLIES:
+        if pattern.match(query):
+            return reply
+    if len(query) < 3:
+        return "Please ask a question."
+    return None
+
+def cached_answer(cache_key: str) -> Optional[dict]:
+    """
+    Looks up a previously computed chat response body.
+    """
+    with tracer.start_as_current_span("answer_cache.get") as span:
+        with answer_cache_lock:
+            cached = answer_cache.get(cache_key)
+        span.set_attribute("cache_hit", cached is not None)
+    return cached
+
+def answer_result(response) -> dict:
+    """
+    Builds the chat response body from a QueryAgent answer.
+    """
+    return {
+        "response": response.final_answer,
+        # Plain dicts: the sources come straight from Weaviate, so there is nothing to validate.
+        # The agent often cites the same object more than once, so keep only the first citation.
+        "sources": list({
+            (source.collection, source.object_id): {"object_id": source.object_id, "collection": source.collection}
+            for source in response.sources
+        }.values())
+    }
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    """
+    Formats one Server-Sent Events frame.
+    """
+    frame = f"data: {orjson.dumps(data).decode()}\n\n"
+    return f"event: {event}\n{frame}" if event else frame
+
+class SourceBatch(BaseModel):
+    # Bounded so each per-collection query stays well under Weaviate's query maximum
+    sources: List[Source] = Field(..., max_length=100)
+
+
+def fetch_objects_by_ids(collection_name: str, object_ids: List[str]) -> dict:
+    """
+    Fetches several objects from one collection in a single query. Returns their properties keyed by object id.
+    """
+    if not object_ids:
+        return {}
+    collection = app.state.collections[collection_name]
+    with tracer.start_as_current_span("weaviate.fetch_objects") as span:
+        span.set_attribute("collection", collection_name)
+        span.set_attribute("n_ids", len(object_ids))
+        result = collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(object_ids),
+            limit=len(object_ids),
+            return_properties=SOURCE_PROPERTIES[collection_name],
+        )
+        span.set_attribute("n_objects", len(result.objects))
+    return {str(obj.uuid): obj.properties for obj in result.objects}
+
+
+def with_parent_pdf(properties: dict, pdf_properties: dict) -> dict:
+    """
+    Returns a chunk's properties with its parent PDF's metadata nested under "pdf". Neither input is modified,
+    since fetched properties can be shared between concurrent requests.
+    """
+    return {
+        **properties,
+        "pdf": {
+            "title": pdf_properties.get("title"),
+            "date": pdf_properties.get("date"),
+            "url": pdf_properties.get("pdf_url"),
+        },
+    }
+
+
+class SourceLoader:
+    """
+    Coalesces object fetches from concurrent requests. Ids requested within a short window are fetched together,
+    with one query per collection, and each caller gets back its own object's properties (or None if missing).
+    """
+    def __init__(self, window: float = 0.015):
+        self.window = window
+        self.pending = {}
+        self.flush_task = None
+
+    async def load(self, collection_name: str, object_id: str) -> Optional[dict]:
+        # Checked and made canonical here, so one caller's bad id fails only its own call rather than the shared
+        # query, and matches the lower-case ids the results are keyed by
+        object_id = str(uuid.UUID(object_id))
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(collection_name, {}).setdefault(object_id, []).append(future)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush())
+        return await future
+
+    async def flush(self):
+        await asyncio.sleep(self.window)
+        pending, self.pending, self.flush_task = self.pending, {}, None
+
+        results = await asyncio.gather(*[
+            asyncio.to_thread(fetch_objects_by_ids, name, list(ids))
+            for name, ids in pending.items()
+        ], return_exceptions=True)
+
+        for (name, ids), result in zip(pending.items(), results):
+            for object_id, futures in ids.items():
+                for future in futures:
+                    if future.done():
+                        continue
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result.get(object_id))
+
 @app.get("/")
 def read_root():
     return {"message": "Weaviate QA Backend is running"}
 
 @app.post("/api/chat")
-def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest):
+    messages = request.messages[-MAX_TURNS:]
+    reply = direct_reply(messages)
+    if reply is not None:
+        return {"response": reply, "sources": []}
+
+    cache_key = conversation_key(messages)
+    cached = cached_answer(cache_key)
+    if cached is not None:
+        return cached
+
     # Convert request messages to Weaviate ChatMessage objects
-    conversation = []
-    for msg in request.messages:
-        conversation.append(ChatMessage(role=msg.role, content=msg.content))
+    conversation = [ChatMessage(role=msg.role, content=msg.content) for msg in messages]
 
     # The last message is the user's query, which is already in the conversation list
     # But qa.ask() expects the conversation history.
     # If we pass the whole conversation list to qa.ask(), it will use it.
     
     try:
-        response = qa.ask(conversation)
-        print("response: ", response)
+        with tracer.start_as_current_span("qa.ask") as span:
+            span.set_attribute("n_messages", len(conversation))
+            # qa.ask blocks on Weaviate + the LLM, so run it off the event loop
+            response = await asyncio.to_thread(app.state.qa.ask, conversation)
+            span.set_attribute("n_sources", len(response.sources))
+        logger.debug("response final_answer_len=%d sources=%d", len(response.final_answer), len(response.sources))
         
-        return {
-            "response": response.final_answer,
-            "sources": [Source(object_id=source.object_id, collection=source.collection) for source in response.sources]
-        }
+        result = answer_result(response)
+        with answer_cache_lock:
+            answer_cache[cache_key] = result
+        return result
     except Exception as e:
-        print(f"Error processing request: {e}")
+        logger.exception("Error processing request")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    messages = request.messages[-MAX_TURNS:]
+    reply = direct_reply(messages)
+    cache_key = conversation_key(messages)
+    cached = {"response": reply, "sources": []} if reply is not None else cached_answer(cache_key)
+
+    conversation = [ChatMessage(role=msg.role, content=msg.content) for msg in messages]
+
+    async def event_stream():
+        # Answer tokens are sent as they are generated, the sources once the answer is complete
+        if cached is not None:
+            yield sse_event({"token": cached["response"]})
+            yield sse_event(cached["sources"], event="sources")
+            return
+
+        # Not start_as_current_span: the generator is suspended between frames, so the span can't stay current
+        span = tracer.start_span("qa.ask_stream", attributes={"n_messages": len(conversation)})
+        first_token = True
+        try:
+            stream = app.state.qa.ask_stream(conversation, include_progress=False, include_final_state=True)
+            while (event := await asyncio.to_thread(next, stream, None)) is not None:
+                if isinstance(event, StreamedTokens):
+                    if first_token:
+                        span.add_event("first_token")
+                        first_token = False
+                    yield sse_event({"token": event.delta})
+                else:
+                    result = answer_result(event)
+                    span.set_attribute("n_sources", len(result["sources"]))
+                    with answer_cache_lock:
+                        answer_cache[cache_key] = result
+                    yield sse_event(result["sources"], event="sources")
+        except Exception as e:
+            logger.exception("Error processing request")
+            span.record_exception(e)
+            yield sse_event({"detail": str(e)}, event="error")
+        finally:
+            span.end()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/api/sources")
-def get_source_object(source: Source):
-    collection = client.collections.use(source.collection)
-    source_obj = collection.query.fetch_object_by_id(source.object_id)
-    
-    properties = source_obj.properties
-    
+async def get_source_object(source: Source):
+    if source.collection not in app.state.collections:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {source.collection}")
+
+    properties = await app.state.source_loader.load(source.collection, str(source.object_id))
+    if properties is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+
     # If it's a chunk, fetch the parent PDF info
     if source.collection == "PDFchunks1" and "doc_id" in properties:
         try:
-            pdfs_collection = client.collections.use("ArxivPDFs")
-            pdf_obj = pdfs_collection.query.fetch_object_by_id(properties["doc_id"])
-            # Merge PDF properties into the response, but keep chunk text distinct
-            properties["pdf_title"] = pdf_obj.properties.get("title")
-            properties["pdf_date"] = pdf_obj.properties.get("date")
-            properties["pdf_url"] = pdf_obj.properties.get("pdf_url")
-        except Exception as e:
-            print(f"Error fetching parent PDF: {e}")
+            pdf_properties = await app.state.source_loader.load("ArxivPDFs", str(properties["doc_id"])) or {}
+            return with_parent_pdf(properties, pdf_properties)
+        except Exception:
+            logger.exception("Error fetching parent PDF")
             
-    return properties
\ No newline at end of file
+    return properties
+
+@app.post("/api/sources/batch")
+async def get_source_objects(batch: SourceBatch):
+    unknown = {source.collection for source in batch.sources} - app.state.collections.keys()
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown collection: {', '.join(sorted(unknown))}")
+
+    # Group the requested ids by collection so each collection is queried once
+    ids_by_collection = {}
+    for source in batch.sources:
+        ids_by_collection.setdefault(source.collection, {})[str(source.object_id)] = None
+
+    results = await asyncio.gather(*[
+        asyncio.to_thread(fetch_objects_by_ids, name, list(ids))
+        for name, ids in ids_by_collection.items()
+    ])
+    objects = dict(zip(ids_by_collection, results))
+
+    # Chunks need their parent PDF, fetched in one more query for any PDFs we don't already have
+    pdfs = objects.setdefault("ArxivPDFs", {})
+    chunks = objects.get("PDFchunks1", {})
+    missing_pdf_ids = {str(p["doc_id"]) for p in chunks.values() if "doc_id" in p} - pdfs.keys()
+    if missing_pdf_ids:
+        try:
+            pdfs.update(await asyncio.to_thread(fetch_objects_by_ids, "ArxivPDFs", list(missing_pdf_ids)))
+        except Exception:
+            logger.exception("Error fetching parent PDFs")
+
+    response = []
+    for source in batch.sources:
+        properties = objects[source.collection].get(str(source.object_id))
+        if properties is not None and source.collection == "PDFchunks1" and "doc_id" in properties:
+            properties = with_parent_pdf(properties, pdfs.get(str(properties["doc_id"]), {}))
+        response.append(properties)
+
+    return response
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop and httptools replace the pure-Python event loop and HTTP parser.
+    # Each worker is a separate process with its own Weaviate client and answer cache.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WORKERS", (os.cpu_count() or 2) * 2)),
+        log_level="info",
+    )
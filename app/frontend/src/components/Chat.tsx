@@ -15,6 +15,9 @@ interface Message {
     sources?: { object_id: string; collection: string }[];
 }
 
+// Only the most recent turns are sent; the backend uses no more than this (MAX_TURNS in main.py)
+const MAX_TURNS = 32;
+
 export default function Chat() {
     const [messages, setMessages] = useState<Message[]>([]);
     const [input, setInput] = useState("");
@@ -44,40 +47,83 @@ export default function Chat() {
         setInput("");
         setIsLoading(true);
 
+        const assistantId = (Date.now() + 1).toString();
+
+        // Creates the assistant message on the first frame, then applies updates to it
+        const updateAssistant = (update: (msg: Message) => Message) => {
+            setMessages((prev) => {
+                const existing = prev.find((msg) => msg.id === assistantId);
+                if (!existing) {
+                    return [...prev, update({ id: assistantId, role: "assistant", content: "" })];
+                }
+                return prev.map((msg) => (msg.id === assistantId ? update(msg) : msg));
+            });
+        };
+
+        const handleFrame = (frame: string) => {
+            let event = "message";
+            let data = "";
+            for (const line of frame.split("\n")) {
+                if (line.startsWith("event: ")) event = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            if (!data) return;
+
+            const payload = JSON.parse(data);
+            if (event === "error") {
+                throw new Error(payload.detail || "Failed to fetch response");
+            } else if (event === "sources") {
+                updateAssistant((msg) => ({ ...msg, sources: payload }));
+            } else {
+                updateAssistant((msg) => ({ ...msg, content: msg.content + payload.token }));
+            }
+        };
+
         try {
-            const response = await fetch("http://127.0.0.1:8000/api/chat", {
+            // The answer is streamed as Server-Sent Events: token frames, then a final sources frame
+            const response = await fetch("http://127.0.0.1:8000/api/chat/stream", {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json",
                 },
-                // Send the entire conversation history including the new message
+                // Send the recent conversation history including the new message
                 // Map to backend expected format if needed (here it matches: role, content)
                 body: JSON.stringify({
-                    messages: newMessages.map(msg => ({
+                    messages: newMessages.slice(-MAX_TURNS).map(msg => ({
                         role: msg.role,
                         content: msg.content
                     }))
                 }),
             });
 
-            if (!response.ok) {
+            if (!response.ok || !response.body) {
                 throw new Error("Failed to fetch response");
             }
 
-            const data = await response.json();
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
 
-            const assistantMessage: Message = {
-                id: (Date.now() + 1).toString(),
-                role: "assistant",
-                content: data.response || "I received your message but got no answer.",
-                sources: data.sources || [],
-            };
+                let boundary;
+                while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                    handleFrame(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
 
-            setMessages((prev) => [...prev, assistantMessage]);
+            updateAssistant((msg) => ({
+                ...msg,
+                content: msg.content || "I received your message but got no answer.",
+                sources: msg.sources || [],
+            }));
         } catch (error) {
             console.error("Error:", error);
             const errorMessage: Message = {
-                id: (Date.now() + 1).toString(),
+                id: `${assistantId}-error`,
                 role: "assistant",
                 content: "Sorry, something went wrong. Please try again.",
             };
@@ -182,7 +228,7 @@ export default function Chat() {
                     ))}
                 </AnimatePresence>
 
-                {isLoading && (
+                {isLoading && messages[messages.length - 1]?.role !== "assistant" && (
                     <motion.div
                         initial={{ opacity: 0, y: 10 }}
                         animate={{ opacity: 1, y: 0 }}
@@ -12,8 +12,12 @@ interface SourceData {
     abstract?: string;
     pdf_url?: string;
     chunk_text?: string;
-    pdf_title?: string;
-    pdf_date?: string;
+    // Parent PDF metadata, only present on chunks
+    pdf?: {
+        title?: string;
+        date?: string;
+        url?: string;
+    };
     [key: string]: any;
 }
 
@@ -65,10 +69,10 @@ export default function Source({ objectId, collection }: SourceProps) {
 
     // Determine display values based on whether it's a chunk or a full PDF
     const isChunk = collection === "PDFchunks1";
-    const title = isChunk ? data.pdf_title : data.title;
-    const date = isChunk ? data.pdf_date : data.date;
+    const title = isChunk ? data.pdf?.title : data.title;
+    const date = isChunk ? data.pdf?.date : data.date;
     const content = isChunk ? data.chunk_text : data.abstract;
-    const url = data.pdf_url;
+    const url = isChunk ? data.pdf?.url : data.pdf_url;
 
     return (
         <div className="min-w-[280px] max-w-[320px] p-4 bg-white rounded-xl border border-slate-200 shadow-sm hover:shadow-md transition-shadow flex flex-col gap-2 snap-start">
@@ -0,0 +1,327 @@
+import aiofiles
+import aiohttp
+import arxiv
+import asyncio
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import weaviate
+from weaviate.util import generate_uuid5
+
+# Shared by both ingestion scripts: downloading papers from arXiv, extracting their text, chunking it, and importing it.
+
+logger = logging.getLogger("ingest")
+
+# Runs of whitespace, words (runs of non-whitespace), and markdown headers up to level 3
+_WS_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\S+")
+_HEADER_RE = re.compile(r'^#{1,3}\s', re.MULTILINE)
+
+# Extracted text is cached next to this file, so both parts share one cache whichever directory they're run from
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_cache")
+
+
+def file_digest(path: str) -> str:
+    """
+    Returns the MD5 hex digest of a file's contents, read in 1 MB blocks.
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def disk_cache(cache_dir: str, suffix: str = ".txt") -> Callable:
+    """
+    Caches the text a function extracts from a file in cache_dir, keyed by the hash of the file's contents (plus any
+    extra arguments). Reruns on unchanged PDFs read the cached text instead of parsing again. None results are not cached.
+    """
+    def decorator(func: Callable[..., Optional[str]]) -> Callable[..., Optional[str]]:
+        def entry_path(pdf_path: str, args: tuple, kwargs: dict) -> str:
+            key = file_digest(pdf_path)
+            if args or kwargs:
+                key += "-" + hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()[:8]
+            return os.path.join(cache_dir, key + suffix)
+
+        @functools.wraps(func)
+        def wrapper(pdf_path: str, *args, **kwargs) -> Optional[str]:
+            try:
+                cache_path = entry_path(pdf_path, args, kwargs)
+            except OSError:
+                return func(pdf_path, *args, **kwargs)
+
+            if os.path.exists(cache_path):
+                with open(cache_path, encoding="utf-8") as f:
+                    return f.read()
+
+            text = func(pdf_path, *args, **kwargs)
+            if text is not None:
+                # Write to a temporary file and rename, so concurrent workers never read a partial entry
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, cache_path)
+            return text
+        return wrapper
+    return decorator
+
+
+def download_papers(query: str, max_results: int = 25, download_dir: str = "pdfs", max_concurrency: int = 8) -> List[Dict[str, Any]]:
+    """
+    Downloads a subset of papers from arXiv. The PDFs are fetched concurrently, at most max_concurrency at a time.
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    # One directory listing instead of a stat per result
+    existing = set(os.listdir(download_dir))
+
+    client = arxiv.Client()
+    search = arxiv.Search(
+        query = query,
+        max_results = max_results,
+        sort_by = arxiv.SortCriterion.Relevance
+    )
+
+    logger.info("Downloading %d papers for query '%s'...", max_results, query)
+
+    # The arXiv client pages through results synchronously, so they're enumerated in a background thread and each
+    # PDF's download starts as soon as its result arrives, instead of after the last page of metadata
+    results = queue.Queue()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        producer = executor.submit(enumerate_results, client, search, results)
+        downloaded_files = asyncio.run(fetch_results(results, download_dir, existing, max_concurrency))
+        producer.result()
+
+    return downloaded_files
+
+def enumerate_results(client: arxiv.Client, search: arxiv.Search, results: queue.Queue):
+    """
+    Puts each arXiv result on the queue as the client yields it, followed by None once there are no more.
+    """
+    try:
+        for result in client.results(search):
+            results.put(result)
+    finally:
+        results.put(None)
+
+async def fetch_pdf(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str, file_path: str, title: str):
+    """
+    Streams one PDF to disk. It's written to a temporary file first so an interrupted download is never mistaken for a complete one.
+    """
+    async with semaphore:
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(f"{file_path}.part", "wb") as f:
+                    while chunk := await response.content.read(65536):
+                        await f.write(chunk)
+            os.replace(f"{file_path}.part", file_path)
+            logger.info("Downloaded: %s", title)
+        except Exception as e:
+            logger.error("Error downloading %s: %s", url, e)
+
+async def fetch_results(results: queue.Queue, download_dir: str, existing: set, max_concurrency: int = 8) -> List[Dict[str, Any]]:
+    """
+    Takes arXiv results off the queue until None, starting the download of each PDF not already in download_dir
+    right away. Returns the papers' metadata once every download has finished.
+    """
+    downloaded_files = []
+    downloads = []
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_concurrency)) as session:
+        while (result := await asyncio.to_thread(results.get)) is not None:
+            # Clean filename to avoid issues
+            filename = f"{result.entry_id.split('/')[-1]}.pdf"
+            file_path = os.path.join(download_dir, filename)
+
+            if filename not in existing:
+                downloads.append(asyncio.create_task(fetch_pdf(session, semaphore, result.pdf_url, file_path, result.title)))
+            else:
+                logger.info("Already exists: %s", result.title)
+
+            result_obj = {"title": result.title, "abstract": result.summary, "pdf_url": result.pdf_url, "date": result.updated.isoformat(" "), "authors": ", ".join(author.name for author in result.authors), "file_path": file_path}
+            downloaded_files.append(result_obj)
+
+        await asyncio.gather(*downloads)
+
+    return downloaded_files
+
+
+@disk_cache(os.path.join(CACHE_ROOT, "pymupdf"), suffix=".txt")
+def extract_text_pymupdf(pdf_path: str) -> str:
+    """
+    Extracts text from a PDF file using PyMuPDF.
+    """
+    # Imported here so part 2 doesn't need PyMuPDF installed
+    import pymupdf
+
+    try:
+        with pymupdf.open(pdf_path) as doc:
+            # Join the pages' text once, in native code, instead of growing a string page by page
+            text = "\n".join(page.get_text() for page in doc)
+    except Exception as e:
+        logger.error("Error reading %s: %s", pdf_path, e)
+        return None
+        
+    return text
+
+
+_converter = None
+
+def get_converter():
+    """
+    Returns this process's DocumentConverter, creating it on first use. Creating one loads Docling's models, so it's done once per process rather than once per PDF.
+    """
+    global _converter
+    if _converter is None:
+        # Imported here so part 1 doesn't need Docling installed
+        from docling.document_converter import DocumentConverter
+        _converter = DocumentConverter()
+    return _converter
+
+@disk_cache(os.path.join(CACHE_ROOT, "docling"), suffix=".md")
+def extract_text_docling(pdf_path: str) -> str:
+    """
+    Extracts text from a PDF file using Docling.
+    """
+    text = ""
+    try:
+        converter = get_converter()
+        doc = converter.convert(pdf_path).document
+
+        text = doc.export_to_markdown()
+    except Exception as e:
+        logger.error("Error reading %s: %s", pdf_path, e)
+        return None
+        
+    return text
+
+
+def chunk_fixed(text: str, doc_id: str, chunk_size: int=256, overlap_fraction: float=0.2) -> List[Dict[str, Any]] :
+    """
+    Uses fixed size chunking with overlap to chunk raw PDF text. Returns a list of chunk objects (doc_id, chunk_id, text).
+    """
+    text = _WS_RE.sub(" ", text)  # Replace multiple whitespces
+    # Only the (start, end) offset of each word is kept; a chunk is one slice of the text from its first word to its last
+    spans = [(m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+    num_words = len(spans)
+
+    overlap_int = int(chunk_size * overlap_fraction)
+    chunks = []
+    chunk_id = 0
+    for i in range(0, num_words, chunk_size):
+        chunk_start = max(i - overlap_int, 0)
+        chunk_end = i + chunk_size
+        chunk = text[spans[chunk_start][0]:spans[min(chunk_end, num_words) - 1][1]]
+        chunks.append({"chunk_id": chunk_id, "doc_id": doc_id, "chunk_text": chunk, "chunk_start": chunk_start, "chunk_end": chunk_end})
+        chunk_id += 1
+
+    return chunks
+
+
+def chunk_markdown(text: str, doc_id: str, chunk_size: int = 256, overlap_fraction: float = 0.2) -> List[dict]:
+    """
+    Uses markdown document-based chunking to chunk raw PDF text. Returns a list of chunk objects (doc_id, chunk_id, text, start_index, end_index).
+    """
+    # Normalize newlines
+    text = text.replace('\r\n', '\n')
+    
+    # Sections start at each header line (e.g., "# Header", "## Header"), plus any text before the first header.
+    # Finding them is one regex pass over the whole text, and sections are just (start, end) offsets into it.
+    section_starts = [m.start() for m in _HEADER_RE.finditer(text)]
+    if not section_starts or section_starts[0] != 0:
+        section_starts.insert(0, 0)
+    section_bounds = zip(section_starts, section_starts[1:] + [len(text)])
+        
+    chunks = []
+    chunk_counter = 0
+    overlap_int = int(chunk_size * overlap_fraction)
+    
+    for section_start, section_end in section_bounds:
+        # Find words and their absolute spans, searching only within the section
+        word_matches = list(_WORD_RE.finditer(text, section_start, section_end))
+        
+        if not word_matches:
+            continue
+            
+        if len(word_matches) <= chunk_size:
+            # If section fits in one chunk, add it
+            windows = [word_matches]
+        else:
+            # If section is too big, split it with overlap
+            windows = [word_matches[i : i + chunk_size] for i in range(0, len(word_matches), chunk_size - overlap_int)]
+
+        for window in windows:
+            chunks.append({
+                "chunk_id": chunk_counter,
+                "doc_id": doc_id,
+                "chunk_text": " ".join(m.group(0) for m in window),
+                "start_index": window[0].start(),
+                "end_index": window[-1].end()
+            })
+            chunk_counter += 1
+
+    return chunks
+
+
+def ingest(client: weaviate.WeaviateClient, pdf_files: List[Dict[str, Any]], extract: Callable[[str], Optional[str]],
+           chunk: Callable[[str, str], List[Dict[str, Any]]], chunks_collection: str, max_workers: int, error_threshold: int = 10):
+    """
+    Imports each PDF into ArxivPDFs and its chunks into chunks_collection, both of which must already exist. The text
+    comes from extract(file_path) and the chunks from chunk(text, doc_uuid). Stops once the batch has more than
+    error_threshold errors.
+    Weaviate has no per-collection switch to pause HNSW indexing during a bulk load and resume it afterwards (skip is
+    immutable). For faster large imports, run the server with ASYNC_INDEXING=true so inserts are acknowledged before they are indexed.
+    """
+    # Extraction runs in worker processes while this process imports the PDFs already extracted, all into one batch,
+    # so parsing overlaps with sending chunks and the batch isn't flushed after every PDF. The Weaviate writes stay in
+    # this process. Workers are spawned rather than forked so they don't inherit the client's open gRPC channel.
+    with client.batch.dynamic() as batch, ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        contents = executor.map(extract, [pdf_file["file_path"] for pdf_file in pdf_files])
+
+        for pdf_file, content in zip(pdf_files, contents):
+            if content:
+                # The PDF's UUID is derived from its URL, so it's known before the row is written and the row
+                # goes out in the same batch as its chunks instead of as its own insert
+                doc_uuid = generate_uuid5(pdf_file["pdf_url"])
+                batch.add_object(collection="ArxivPDFs", uuid=doc_uuid, properties={
+                    "title": pdf_file["title"],
+                    "abstract": pdf_file["abstract"],
+                    "pdf_url": pdf_file["pdf_url"],
+                    "date": pdf_file["date"],
+                    "authors": pdf_file["authors"],
+                    "file_path": pdf_file["file_path"],
+                    "content": content,
+                })
+
+                chunks = chunk(content, doc_uuid)
+                for obj in chunks:
+                    obj["doc_title"] = pdf_file["title"]
+                    batch.add_object(collection=chunks_collection, properties=obj)
+
+                    if batch.number_errors > error_threshold:
+                        break
+
+                logger.info("%s: queued as %s with %d chunks", pdf_file["file_path"], doc_uuid, len(chunks))
+
+            if batch.number_errors > error_threshold:
+                logger.error("Too many errors, aborting batch import")
+                executor.shutdown(wait=False, cancel_futures=True)
+                break
+
+    # Failures accumulate over the whole batch, so they are read once, after it has flushed
+    failed_objects = client.batch.failed_objects
+    if failed_objects:
+        logger.error("%d objects failed to import", len(failed_objects))
+        for failed in failed_objects[:3]:
+            logger.error("Error: %s for object: %s", failed.message, failed.object_)
@@ -1,3 +1,5 @@
+import atexit
+import sys
 import weaviate
 from weaviate.agents.query import QueryAgent
 from weaviate.classes.init import Auth
@@ -9,15 +11,44 @@ load_dotenv()
 weaviate_url = os.environ["WEAVIATE_URL"]
 weaviate_api_key = os.environ["WEAVIATE_API_KEY"]
 
-client = weaviate.connect_to_weaviate_cloud(
-    cluster_url=weaviate_url,
-    auth_credentials=Auth.api_key(weaviate_api_key),
-)
+DEFAULT_QUESTION = "What are some common themes in machine learning over the last decade?"
 
-qa = QueryAgent(
-    client=client, collections=["ArxivPDFs", "PDFchunks1"]
-)
 
-response = qa.ask("What are some common themes in machine learning over the last decade?")
-print("sources: ", response.sources)
-print("final answer: ", response.final_answer)
\ No newline at end of file
+def answer(qa: QueryAgent, question: str):
+    """
+    Asks the agent one question and prints its sources and answer.
+    """
+    response = qa.ask(question)
+    print("sources: ", response.sources)
+    print("final answer: ", response.final_answer)
+
+
+def main():
+    client = weaviate.connect_to_weaviate_cloud(
+        cluster_url=weaviate_url,
+        auth_credentials=Auth.api_key(weaviate_api_key),
+    )
+    atexit.register(client.close)
+
+    qa = QueryAgent(
+        client=client, collections=["ArxivPDFs", "PDFchunks1"]
+    )
+
+    # With no arguments the demo question is answered once, and a question given on the command line is answered
+    # instead. With -i, the client stays open and answers questions until EOF, so the connection is only set up once.
+    if sys.argv[1:] != ["-i"]:
+        answer(qa, " ".join(sys.argv[1:]) or DEFAULT_QUESTION)
+        return
+
+    while True:
+        try:
+            question = input("question> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if question:
+            answer(qa, question)
+
+
+if __name__ == "__main__":
+    main()
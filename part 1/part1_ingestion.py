@@ -1,93 +1,31 @@
-import arxiv
+import logging
 import os
-import pymupdf
-from typing import List, Dict, Any
-import re
+import sys
 import weaviate
-from weaviate.classes.config import Configure, Property, DataType
+from weaviate.classes.config import Configure, Reconfigure, Property, DataType
 from weaviate.classes.init import Auth
 from dotenv import load_dotenv
 
+# arxiv_utils lives in the repository root, shared by both parts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from arxiv_utils import download_papers, ingest, extract_text_pymupdf, chunk_fixed
+
 load_dotenv()
 
+logger = logging.getLogger("ingest")
+
 weaviate_url = os.environ["WEAVIATE_URL"]
 weaviate_api_key = os.environ["WEAVIATE_API_KEY"]
 
+# Processes used to extract text from PDFs. Parsing is CPU-bound and independent per file.
+extract_workers = int(os.environ.get("EXTRACT_WORKERS", os.cpu_count() or 1))
 
-def download_papers(query: str = "machine learning", max_results: int = 25, download_dir: str = "pdfs") -> List[Dict[str, Any]]:
-    """
-    Downloads a subset of papers from arXiv.
-    """
-    if not os.path.exists(download_dir):
-        os.makedirs(download_dir)
-    
-    client = arxiv.Client()
-    search = arxiv.Search(
-        query = query,
-        max_results = max_results,
-        sort_by = arxiv.SortCriterion.Relevance
-    )
-
-    downloaded_files = []
-    print(f"Downloading {max_results} papers for query '{query}'...")
-    
-    
-    for result in client.results(search):
-        # Clean filename to avoid issues
-        filename = f"{result.entry_id.split('/')[-1]}.pdf"
-        file_path = os.path.join(download_dir, filename)
-        
-        if not os.path.exists(file_path):
-            result.download_pdf(dirpath=download_dir, filename=filename)
-            print(f"Downloaded: {result.title}")
-        else:
-            print(f"Already exists: {result.title}")
-
-        result_obj = {"title": result.title, "abstract": result.summary, "pdf_url": result.pdf_url, "date": str(result.updated), "authors": ", ".join([author.name for author in result.authors]), "file_path": file_path}    
-        downloaded_files.append(result_obj)
-        
-    return downloaded_files
-
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """
-    Extracts text from a PDF file using PyPDF2.
-    """
-    text = ""
-    try:
-        doc = pymupdf.open(pdf_path)
-        for page in doc: # iterate the document pages
-            page_text = page.get_text().encode("utf8") # get plain text (is in UTF-8)
-            text += str(page_text)
-    except Exception as e:
-        print(f"Error reading {pdf_path}: {e}")
-        return None
-        
-    return text
-
-
-def chunk_text(text: str, doc_id: str, chunk_size: int=256, overlap_fraction: float=0.2) -> List[Dict[str, Any]] :
-    """
-    Uses fixed size chunking with overlap to chunk raw PDF text. Returns a list of chunk objects (doc_id, chunk_id, text).
-    """
-    text = re.sub(r"\s+", " ", text)  # Replace multiple whitespces
-    text_words = re.split(r"\s", text)  # Split by single whitespace
-
-    overlap_int = int(chunk_size * overlap_fraction)
-    chunks = []
-    chunk_id = 0
-    for i in range(0, len(text_words), chunk_size):
-        chunk_words = text_words[max(i - overlap_int, 0): i + chunk_size]
-        chunk = " ".join(chunk_words)
-        chunk_start = max(i - overlap_int, 0)
-        chunk_end = i + chunk_size
-        chunks.append({"chunk_id": chunk_id, "doc_id": doc_id, "chunk_text": chunk, "chunk_start": chunk_start, "chunk_end": chunk_end})
-        chunk_id += 1
-
-    return chunks
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", force=True)
+
     # 1. Download PDFs
-    pdf_files = download_papers()
+    pdf_files = download_papers("machine learning")
 
     client = weaviate.connect_to_weaviate_cloud(
         cluster_url=weaviate_url,
@@ -98,7 +36,11 @@ def main():
         client.collections.create(
             "PDFchunks1",
             description="A dataset that contains all the chunks of the PDFs (fixed size, overlap). The doc_id is the UUID of the PDF it belongs to in the ArxivPDFs collection.",
-            vector_config=Configure.Vectors.text2vec_weaviate(),
+            # The QueryAgent searches this collection interactively, so use a fixed, lower ef
+            # for faster queries and a higher ef_construction to keep the graph's recall up
+            vector_config=Configure.Vectors.text2vec_weaviate(
+                vector_index_config=Configure.VectorIndex.hnsw(ef=64, ef_construction=256),
+            ),
             properties=[
                 Property(name="chunk_id", description="The chunk id of the chunk", data_type=DataType.INT, skip_vectorization=True),
                 Property(name="doc_id", description="The UUID of the PDF it belongs to in the ArxivPDFs collection", data_type=DataType.UUID, skip_vectorization=True),
@@ -108,6 +50,15 @@ def main():
                 Property(name="doc_title", description="The title of the PDF it belongs to in the ArxivPDFs collection", data_type=DataType.TEXT),
             ],
         )
+    else:
+        # ef can be changed in place, so a collection created before it was tuned gets it too.
+        # Its vector is the named "default" one from Configure.Vectors.
+        client.collections.use("PDFchunks1").config.update(
+            vector_config=Reconfigure.Vectors.update(
+                name="default",
+                vector_index_config=Reconfigure.VectorIndex.hnsw(ef=64),
+            ),
+        )
     
     if not client.collections.exists("ArxivPDFs"):
         client.collections.create(
@@ -124,49 +75,12 @@ def main():
             ],
         )
 
-    chunks_collection = client.collections.use("PDFchunks1")
-    pdfs_collection = client.collections.use("ArxivPDFs")
-
-    print("\n--- Extracting Text ---\n")
-
-    # 2. Extract Text
-    for pdf_file in pdf_files:
-        
-        print(f"Processing: {pdf_file['file_path']}")
-        content = extract_text_from_pdf(pdf_file["file_path"])
-        
-        if content:
-            pdf_file["content"] = content
-
-            doc_uuid = pdfs_collection.data.insert({
-                "title": pdf_file["title"],
-                "abstract": pdf_file["abstract"],
-                "pdf_url": pdf_file["pdf_url"],
-                "date": pdf_file["date"],
-                "authors": pdf_file["authors"],
-                "file_path": pdf_file["file_path"],
-                "content": pdf_file["content"],
-            })
-
-            print(doc_uuid, " inserted")
-            
-            chunks = chunk_text(pdf_file["content"], doc_uuid)
-            error_threshold = 10  # Max errors before aborting
-            with chunks_collection.batch.fixed_size(batch_size=100) as batch:
-                for obj in chunks:
-                    obj["doc_title"] = pdf_file["title"]
-                    batch.add_object(properties=obj)
-
-                    if batch.number_errors > error_threshold:
-                        print("Too many errors, aborting batch import")
-                        break
-
-            if chunks_collection.batch.failed_objects:
-                for failed in chunks_collection.batch.failed_objects[:3]:
-                    print(f"Error: {failed.message} for object: {failed.object_}")
+    logger.info("--- Extracting Text ---")
 
+    # 2. Extract Text, chunk it and import it
+    ingest(client, pdf_files, extract_text_pymupdf, chunk_fixed, "PDFchunks1", extract_workers)
 
-    print("\n--- Ingestion Complete ---\n")
+    logger.info("--- Ingestion Complete ---")
     client.close()
 
 